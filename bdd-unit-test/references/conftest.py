@@ -0,0 +1,27 @@
+"""
+pytest 設定：此測試樹一律直接使用 unittest.mock
+
+pytest-mock（1.12 以上）每次 patch 都會走訪呼叫堆疊定位來源，
+成本約為直接使用 unittest.mock 的兩倍；本範例刻意不依賴
+mocker fixture，此守門機制避免後續貢獻者無意間引入。
+"""
+
+import pytest
+
+
+def pytest_configure(config):
+    # 註冊 slow 標記：超出單測試時間預算的測試（如需完整建構依賴的
+    # 時間場景）標為 slow，開發內圈可用 pytest -m "not slow" 跳過
+    config.addinivalue_line(
+        "markers", "slow: 執行成本較高的測試，內圈開發可用 -m 'not slow' 排除"
+    )
+
+
+def pytest_collection_modifyitems(items):
+    # 在收集階段即擋下 mocker fixture，避免回歸到 pytest-mock 的 patch 成本
+    for item in items:
+        if "mocker" in getattr(item, "fixturenames", ()):
+            raise pytest.UsageError(
+                f"{item.nodeid}: 此測試樹禁用 pytest-mock 的 mocker fixture，"
+                "請改用 unittest.mock"
+            )
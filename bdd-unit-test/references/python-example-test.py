@@ -6,225 +6,214 @@ Python/pytest BDD 單元測試範例
 """
 
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from collections import namedtuple
+from unittest.mock import Mock, call
 from decimal import Decimal
-from datetime import datetime
+from types import MappingProxyType
 
 from order_service import OrderService
 from exceptions import InsufficientStockError, InvalidOrderError
 
 
+# Decimal 字串解析成本不低，預期總額與單價於載入時建構一次重複使用；
+# _D 僅為 Decimal 的簡寫別名
+_D = Decimal
+_PRICE_100 = _D("100.00")
+TOTAL_SIMPLE = _D("350.00")
+TOTAL_DISCOUNTED = _D("1350.00")
+TOTAL_ZERO = _D("0.00")
+
+# 測試共用的訂單資料：模組載入時建構一次，避免每個參數列重複配置
+# dict 與 Decimal；MappingProxyType 保證共享物件不會被測試誤改
+_ORDER_CREATED = MappingProxyType({
+    "id": "ORD-001",
+    "product_id": "PROD-A",
+    "quantity": 5,
+    "status": "CREATED"
+})
+_ORDER_SHIPPED = MappingProxyType({"id": "ORD-001", "status": "SHIPPED"})
+_ITEMS_SIMPLE = (
+    MappingProxyType(
+        {"product_id": "A", "quantity": 2, "unit_price": _PRICE_100}
+    ),
+    MappingProxyType(
+        {"product_id": "B", "quantity": 3, "unit_price": _D("50.00")}
+    ),
+)
+_ITEMS_DISCOUNTED = (
+    MappingProxyType(
+        {"product_id": "A", "quantity": 10, "unit_price": _D("150.00")}
+    ),
+)
+
+
+# 受測沙盒：service 與其兩個 mock 依賴，整個測試階段只建構一次
+Sandbox = namedtuple("Sandbox", ["service", "inv", "order"])
+
+
 class TestOrderService:
-    """OrderService 單元測試"""
-
-    @pytest.fixture
-    def mock_inventory_repo(self):
-        """建立 mock 庫存倉庫"""
-        return Mock()
-
-    @pytest.fixture
-    def mock_order_repo(self):
-        """建立 mock 訂單倉庫"""
-        return Mock()
-
-    @pytest.fixture
-    def order_service(self, mock_inventory_repo, mock_order_repo):
-        """建立被測試的服務實例"""
-        return OrderService(
-            inventory_repo=mock_inventory_repo,
-            order_repo=mock_order_repo
+    """OrderService 單元測試
+
+    fixture 範圍由外而內遞減：沙盒為 session，parametrize 標記放在
+    最內層的測試函式上，讓 pytest 的 reorder_items 能把共用同組
+    setup 的測試排在一起，避免逐列重跑高範圍 fixture。
+    """
+
+    @pytest.fixture(scope="session")
+    def _sandbox(self):
+        """整個測試階段只建構一次的受測沙盒
+
+        spec_set 限縮在測試實際用到的方法，避免 Mock 為未使用的
+        屬性延遲產生子 mock 並追蹤其呼叫。
+        """
+        inv = Mock(spec_set=["get_stock", "reserve_stock", "release_stock"])
+        order = Mock(spec_set=["save", "find_by_id", "update"])
+        return Sandbox(
+            service=OrderService(inventory_repo=inv, order_repo=order),
+            inv=inv,
+            order=order,
         )
 
-    class TestCreateOrder:
-        """create_order 方法的測試"""
-
-        def test_GivenSufficientStock_WhenCreateOrder_ShouldCreateSuccessfully(
-            self, order_service, mock_inventory_repo, mock_order_repo
-        ):
-            """應該在庫存充足時成功建立訂單"""
-            # Given - 產品有足夠庫存
-            mock_inventory_repo.get_stock.return_value = 100
-            mock_inventory_repo.reserve_stock.return_value = True
-            mock_order_repo.save.return_value = {
-                "id": "ORD-001",
-                "product_id": "PROD-A",
-                "quantity": 5,
-                "status": "CREATED"
-            }
-
+    @pytest.fixture(autouse=True)
+    def sandbox(self, _sandbox):
+        """每個測試開始前還原 mock 的 return_value / side_effect，維持測試隔離"""
+        _sandbox.inv.reset_mock(return_value=True, side_effect=True)
+        _sandbox.order.reset_mock(return_value=True, side_effect=True)
+        return _sandbox
+
+    @pytest.mark.parametrize(
+        "stock,quantity,expect,messages",
+        [
+            (100, 5, "CREATED", ()),
+            (3, 10, InsufficientStockError, ("Insufficient stock", "PROD-A")),
+            (100, 0, InvalidOrderError, ("Quantity must be positive",)),
+            (100, -5, InvalidOrderError, ("Quantity must be positive",)),
+        ],
+        ids=[
+            "GivenSufficientStock_WhenCreateOrder_ShouldCreateSuccessfully",
+            "GivenInsufficientStock_WhenCreateOrder_ShouldRaiseError",
+            "GivenZeroQuantity_WhenCreateOrder_ShouldRaiseError",
+            "GivenNegativeQuantity_WhenCreateOrder_ShouldRaiseError",
+        ],
+    )
+    def test_create_order(self, sandbox, stock, quantity, expect, messages):
+        """create_order：以參數列展開 Happy Path / Edge / Error 場景"""
+        # Given - 庫存狀態與儲存結果
+        # configure_mock 的點號 kwargs 一次解析子 mock 與 return_value，
+        # 省去逐屬性存取時重複的 _get_child_mock 配置
+        sandbox.inv.configure_mock(**{
+            "get_stock.return_value": stock,
+            "reserve_stock.return_value": True,
+        })
+        sandbox.order.configure_mock(**{"save.return_value": _ORDER_CREATED})
+
+        if isinstance(expect, type) and issubclass(expect, Exception):
+            # When & Then - 應拋出對應的例外
+            with pytest.raises(expect) as exc_info:
+                sandbox.service.create_order(
+                    product_id="PROD-A",
+                    quantity=quantity,
+                    customer_id="CUST-001"
+                )
+            # 逐一驗證錯誤訊息片段，例如庫存不足需同時含原因與 product_id
+            for fragment in messages:
+                assert fragment in str(exc_info.value)
+        else:
             # When - 建立訂單
-            result = order_service.create_order(
+            result = sandbox.service.create_order(
                 product_id="PROD-A",
-                quantity=5,
+                quantity=quantity,
                 customer_id="CUST-001"
             )
 
-            # Then - 訂單應被建立
+            # Then - 訂單應被建立且庫存被保留
             assert result["id"] == "ORD-001"
-            assert result["status"] == "CREATED"
-            # 驗證庫存被保留
-            mock_inventory_repo.reserve_stock.assert_called_once_with("PROD-A", 5)
-
-        def test_GivenInsufficientStock_WhenCreateOrder_ShouldRaiseError(
-            self, order_service, mock_inventory_repo
-        ):
-            """應該在庫存不足時拋出 InsufficientStockError"""
-            # Given - 產品庫存不足
-            mock_inventory_repo.get_stock.return_value = 3
-
-            # When & Then - 應拋出庫存不足錯誤
-            with pytest.raises(InsufficientStockError) as exc_info:
-                order_service.create_order(
-                    product_id="PROD-A",
-                    quantity=10,
-                    customer_id="CUST-001"
-                )
-
-            assert "Insufficient stock" in str(exc_info.value)
-            assert "PROD-A" in str(exc_info.value)
-
-        def test_GivenZeroOrNegativeQuantity_WhenCreateOrder_ShouldRaiseError(
-            self, order_service
-        ):
-            """應該在數量為零或負數時拋出 InvalidOrderError"""
-            # Given - 無效的數量
-
-            # When & Then - 數量為零
-            with pytest.raises(InvalidOrderError) as exc_info:
-                order_service.create_order(
-                    product_id="PROD-A",
-                    quantity=0,
-                    customer_id="CUST-001"
-                )
-            assert "Quantity must be positive" in str(exc_info.value)
-
-            # When & Then - 數量為負數
-            with pytest.raises(InvalidOrderError):
-                order_service.create_order(
-                    product_id="PROD-A",
-                    quantity=-5,
-                    customer_id="CUST-001"
-                )
-
-    class TestCancelOrder:
-        """cancel_order 方法的測試"""
-
-        def test_GivenOrderExists_WhenCancel_ShouldCancelAndReleaseStock(
-            self, order_service, mock_order_repo, mock_inventory_repo
-        ):
-            """應該取消訂單並釋放庫存"""
-            # Given - 訂單存在且狀態為 CREATED
-            mock_order_repo.find_by_id.return_value = {
-                "id": "ORD-001",
-                "product_id": "PROD-A",
-                "quantity": 5,
-                "status": "CREATED"
-            }
-
+            assert result["status"] == expect
+            # 單次 method_calls 相等比較取代 assert_called_once_with，
+            # 同時驗證「先查庫存、再保留」的呼叫順序
+            assert sandbox.inv.method_calls == [
+                call.get_stock("PROD-A"),
+                call.reserve_stock("PROD-A", quantity),
+            ]
+
+    @pytest.mark.parametrize(
+        "order,expect,message",
+        [
+            (_ORDER_CREATED, "CANCELLED", None),
+            (
+                _ORDER_SHIPPED,
+                InvalidOrderError,
+                "Cannot cancel shipped order",
+            ),
+            (None, InvalidOrderError, "Order not found"),
+        ],
+        ids=[
+            "GivenOrderExists_WhenCancel_ShouldCancelAndReleaseStock",
+            "GivenOrderAlreadyShipped_WhenCancel_ShouldRaiseError",
+            "GivenOrderNotExists_WhenCancel_ShouldRaiseError",
+        ],
+    )
+    def test_cancel_order(self, sandbox, order, expect, message):
+        """cancel_order：以參數列展開取消成功與各種失敗場景"""
+        # Given - 訂單查詢結果；凍結常數以可變複本餵入，服務可就地
+        # 修改訂單狀態，不強迫實作採 copy-on-write
+        sandbox.order.find_by_id.return_value = dict(order) if order is not None else None
+
+        if isinstance(expect, type) and issubclass(expect, Exception):
+            # When & Then - 應拋出對應的例外
+            with pytest.raises(expect) as exc_info:
+                sandbox.service.cancel_order("ORD-001")
+            assert message in str(exc_info.value)
+        else:
             # When - 取消訂單
-            result = order_service.cancel_order("ORD-001")
+            result = sandbox.service.cancel_order("ORD-001")
 
             # Then - 訂單應被取消且庫存釋放
-            assert result["status"] == "CANCELLED"
-            mock_inventory_repo.release_stock.assert_called_once_with("PROD-A", 5)
-
-        def test_GivenOrderAlreadyShipped_WhenCancel_ShouldRaiseError(
-            self, order_service, mock_order_repo
-        ):
-            """應該在訂單已出貨時拋出錯誤"""
-            # Given - 訂單已出貨
-            mock_order_repo.find_by_id.return_value = {
-                "id": "ORD-001",
-                "status": "SHIPPED"
-            }
-
-            # When & Then - 應拋出無法取消錯誤
-            with pytest.raises(InvalidOrderError) as exc_info:
-                order_service.cancel_order("ORD-001")
-
-            assert "Cannot cancel shipped order" in str(exc_info.value)
-
-        def test_GivenOrderNotExists_WhenCancel_ShouldRaiseError(
-            self, order_service, mock_order_repo
-        ):
-            """應該在訂單不存在時拋出錯誤"""
-            # Given - 訂單不存在
-            mock_order_repo.find_by_id.return_value = None
-
-            # When & Then - 應拋出訂單不存在錯誤
-            with pytest.raises(InvalidOrderError) as exc_info:
-                order_service.cancel_order("ORD-999")
-
-            assert "Order not found" in str(exc_info.value)
-
-    class TestCalculateOrderTotal:
-        """calculate_order_total 方法的測試"""
-
-        def test_GivenOrderItems_WhenCalculateTotal_ShouldReturnCorrectSum(
-            self, order_service, mock_order_repo
-        ):
-            """應該正確計算無折扣的訂單總額"""
-            # Given - 訂單項目
-            mock_order_repo.find_by_id.return_value = {
-                "id": "ORD-001",
-                "items": [
-                    {"product_id": "A", "quantity": 2, "unit_price": Decimal("100.00")},
-                    {"product_id": "B", "quantity": 3, "unit_price": Decimal("50.00")},
-                ]
-            }
-
-            # When - 計算總額
-            total = order_service.calculate_order_total("ORD-001")
-
-            # Then - 總額應為 2*100 + 3*50 = 350
-            assert total == Decimal("350.00")
-
-        def test_GivenTotalExceedsThreshold_WhenCalculate_ShouldApplyDiscount(
-            self, order_service, mock_order_repo
-        ):
-            """應該在總額超過門檻時套用折扣"""
-            # Given - 訂單總額超過 1000（10% 折扣門檻）
-            mock_order_repo.find_by_id.return_value = {
-                "id": "ORD-001",
-                "items": [
-                    {"product_id": "A", "quantity": 10, "unit_price": Decimal("150.00")},
-                ]
-            }
-
-            # When - 計算總額（含折扣）
-            total = order_service.calculate_order_total("ORD-001")
-
-            # Then - 應套用 10% 折扣：1500 * 0.9 = 1350
-            assert total == Decimal("1350.00")
-
-        def test_GivenNoItems_WhenCalculateTotal_ShouldReturnZero(
-            self, order_service, mock_order_repo
-        ):
-            """應該在訂單無項目時返回零"""
-            # Given - 空訂單
-            mock_order_repo.find_by_id.return_value = {
-                "id": "ORD-001",
-                "items": []
-            }
-
-            # When - 計算總額
-            total = order_service.calculate_order_total("ORD-001")
-
-            # Then - 總額應為 0
-            assert total == Decimal("0.00")
+            assert result["status"] == expect
+            assert sandbox.inv.method_calls == [
+                call.release_stock("PROD-A", 5)
+            ]
+
+    @pytest.mark.parametrize(
+        "items,expect",
+        [
+            (_ITEMS_SIMPLE, TOTAL_SIMPLE),
+            # 總額超過 1000 門檻，套用 10% 折扣：1500 * 0.9 = 1350
+            (_ITEMS_DISCOUNTED, TOTAL_DISCOUNTED),
+            ((), TOTAL_ZERO),
+        ],
+        ids=[
+            "GivenOrderItems_WhenCalculateTotal_ShouldReturnCorrectSum",
+            "GivenTotalExceedsThreshold_WhenCalculate_ShouldApplyDiscount",
+            "GivenNoItems_WhenCalculateTotal_ShouldReturnZero",
+        ],
+    )
+    def test_calculate_order_total(self, sandbox, items, expect):
+        """calculate_order_total：以參數列展開一般、折扣與空訂單場景"""
+        # Given - 訂單項目
+        sandbox.order.find_by_id.return_value = {
+            "id": "ORD-001",
+            "items": items
+        }
+
+        # When - 計算總額
+        total = sandbox.service.calculate_order_total("ORD-001")
+
+        # Then - 總額應符合預期
+        assert total == expect
 
 
 class TestOrderServiceWithDatetime:
-    """測試涉及時間的場景（示範如何 mock datetime）"""
+    """測試涉及時間的場景（示範以注入 clock 取代 mock datetime）"""
 
-    @patch('order_service.datetime')
-    def test_GivenFixedTime_WhenCreateOrder_ShouldSetCreatedAtCorrectly(
-        self, mock_datetime
-    ):
+    @pytest.mark.slow
+    def test_GivenFixedTime_WhenCreateOrder_ShouldSetCreatedAtCorrectly(self):
         """應該將建立時間設為當前時間"""
-        # Given - 固定當前時間
+        # datetime 僅此測試使用，故採函式內 import
+        from datetime import datetime
+
+        # Given - 以注入的 clock 固定當前時間，省去 @patch 的堆疊成本
         fixed_time = datetime(2024, 1, 15, 10, 30, 0)
-        mock_datetime.now.return_value = fixed_time
 
         mock_inventory_repo = Mock()
         mock_inventory_repo.get_stock.return_value = 100
@@ -236,7 +225,12 @@ class TestOrderServiceWithDatetime:
             "id": "ORD-001"
         }
 
-        service = OrderService(mock_inventory_repo, mock_order_repo)
+        # OrderService.__init__ 接受 clock=datetime.now 參數
+        service = OrderService(
+            mock_inventory_repo,
+            mock_order_repo,
+            clock=lambda: fixed_time
+        )
 
         # When - 建立訂單
         result = service.create_order(